@@ -1,149 +1,273 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, validator
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import ORJSONResponse, Response
+from pydantic import BaseModel
 from typing import List
 from enum import Enum
 import sqlite3
+import json
 import uuid
 import asyncio
-from collections import deque
-from datetime import datetime
+import queue
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+import heapq
+import itertools
+import time
 import os
+import orjson
 import uvicorn
 
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse)
 
 class Priority(str, Enum):
     HIGH = "HIGH"
     MEDIUM = "MEDIUM"
     LOW = "LOW"
 
+# Schema and type only: /ingest validates the raw body in parse_ingestion_request
+# and builds instances with model_construct, so pydantic never validates at runtime
 class IngestionRequest(BaseModel):
     ids: List[int]
     priority: Priority
 
-    @validator('ids')
-    def validate_ids(cls, ids):
-        if not ids:
-            raise ValueError("IDs list cannot be empty")
-        for id in ids:
-            if not (1 <= id <= 1000000007):
-                raise ValueError("IDs must be between 1 and 10^9+7")
-        return ids
+def request_body_schema(model) -> dict:
+    # Inline referenced definitions so the schema resolves when embedded in the OpenAPI document
+    schema = model.model_json_schema(ref_template='{model}')
+    definitions = schema.pop('$defs', {})
+    for prop in schema['properties'].values():
+        if '$ref' in prop:
+            prop.update(definitions[prop.pop('$ref')])
+    schema['additionalProperties'] = False
+    return schema
 
-job_queue = deque()
-queue_lock = asyncio.Lock()
+def parse_ingestion_request(body: bytes) -> IngestionRequest:
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise ValueError("Request body must be valid JSON")
+    if not isinstance(payload, dict) or payload.keys() != {'ids', 'priority'}:
+        raise ValueError("Request body must be an object with 'ids' and 'priority' only")
+    ids = payload['ids']
+    if not isinstance(ids, list) or set(map(type, ids)) - {int}:
+        raise ValueError("IDs must be a list of integers")
+    if not ids:
+        raise ValueError("IDs list cannot be empty")
+    if min(ids) < 1 or max(ids) > 1000000007:
+        raise ValueError("IDs must be between 1 and 10^9+7")
+    return IngestionRequest.model_construct(ids=ids, priority=Priority(payload['priority']))
+
+PRIORITY_RANK = {priority: rank for rank, priority in enumerate(Priority)}
+
+job_queue: List[tuple] = []
+job_seq = itertools.count()
+job_event = asyncio.Event()
+
+class LRUCache(OrderedDict):
+    def __init__(self, maxsize: int):
+        super().__init__()
+        self.maxsize = maxsize
+
+    def get(self, key, default=None):
+        if key not in self:
+            return default
+        self.move_to_end(key)
+        return self[key]
+
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        if len(self) > self.maxsize:
+            self.popitem(last=False)
+
+# Completed ingestions never change again, so their serialized status can be reused as-is
+COMPLETED_STATUS_CACHE = LRUCache(maxsize=1024)
+# A batch's ids never change after insert; only touched from the event loop thread
+BATCH_IDS_CACHE = LRUCache(maxsize=100000)
+
+DB_PATH = 'ingestion.db'
+READER_POOL_SIZE = os.cpu_count() or 4
+
+def connect_db(readonly=False):
+    if readonly:
+        conn = sqlite3.connect(f'file:{DB_PATH}?mode=ro', uri=True, isolation_level=None, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript("""
+        PRAGMA synchronous=NORMAL;
+        PRAGMA busy_timeout=5000;
+        PRAGMA cache_size=-20000;
+        PRAGMA temp_store=MEMORY;
+    """)
+    return conn
 
 def init_db():
-    conn = sqlite3.connect('ingestion.db')
+    conn = connect_db()
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS ingestions
                  (ingestion_id TEXT PRIMARY KEY, status TEXT, created_time INTEGER)''')
     c.execute('''CREATE TABLE IF NOT EXISTS batches
                  (batch_id TEXT PRIMARY KEY, ingestion_id TEXT, ids TEXT, status TEXT,
                   FOREIGN KEY (ingestion_id) REFERENCES ingestions(ingestion_id))''')
-    conn.commit()
+    c.execute("CREATE INDEX IF NOT EXISTS idx_batches_ingestion ON batches(ingestion_id)")
+    c.execute('''CREATE TRIGGER IF NOT EXISTS trg_roll_up AFTER UPDATE OF status ON batches
+                 BEGIN
+                     UPDATE ingestions SET status = (
+                         SELECT CASE WHEN SUM(status = 'triggered') > 0 THEN 'triggered'
+                                     WHEN SUM(status != 'completed') = 0 THEN 'completed'
+                                     ELSE 'yet_to_start' END
+                         FROM batches WHERE ingestion_id = NEW.ingestion_id)
+                     WHERE ingestion_id = NEW.ingestion_id;
+                 END''')
+    c.execute("ANALYZE")
     conn.close()
 
 init_db()
 
+WRITER_CONN = connect_db()
+writer_lock = threading.Lock()
+READER_POOL = queue.SimpleQueue()
+for _ in range(READER_POOL_SIZE):
+    READER_POOL.put(connect_db(readonly=True))
+
+@contextmanager
+def get_reader():
+    conn = READER_POOL.get()
+    try:
+        yield conn
+    finally:
+        READER_POOL.put(conn)
+
+@contextmanager
+def write_transaction():
+    # Held by the worker thread itself, so cancelling the awaiting task cannot release it mid-transaction
+    with writer_lock:
+        c = WRITER_CONN.cursor()
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            yield c
+            c.execute("COMMIT")
+        except BaseException:
+            c.execute("ROLLBACK")
+            raise
+
 async def fetch_data_from_external_api(id: int):
     await asyncio.sleep(1)  # Simulate 1-second delay
     return {"id": id, "data": "processed"}
 
-async def process_batch(batch_id: str, ingestion_id: str, ids: List[int]):
+def _set_batch_status_db(batch_id: str, status: str):
+    with write_transaction() as c:
+        c.execute("UPDATE batches SET status = ? WHERE batch_id = ?", (status, batch_id))
+
+async def process_batch(batch_id: str, ids: List[int]):
     try:
-        for id in ids:
-            await fetch_data_from_external_api(id)
-        conn = sqlite3.connect('ingestion.db')
-        c = conn.cursor()
-        c.execute("UPDATE batches SET status = ? WHERE batch_id = ?", ('completed', batch_id))
-        c.execute("SELECT status FROM batches WHERE ingestion_id = ?", (ingestion_id,))
-        statuses = [row[0] for row in c.fetchall()]
-        overall_status = 'yet_to_start'
-        if 'triggered' in statuses:
-            overall_status = 'triggered'
-        elif all(s == 'completed' for s in statuses):
-            overall_status = 'completed'
-        c.execute("UPDATE ingestions SET status = ? WHERE ingestion_id = ?", (overall_status, ingestion_id))
-        conn.commit()
-        conn.close()
+        await asyncio.gather(*(fetch_data_from_external_api(id) for id in ids))
+        await asyncio.to_thread(_set_batch_status_db, batch_id, 'completed')
     except Exception as e:
         print(f"Error processing batch {batch_id}: {e}")
 
 async def process_jobs():
     while True:
         if not job_queue:
-            await asyncio.sleep(1)
+            job_event.clear()
+            await job_event.wait()
             continue
-        async with queue_lock:
-            high_priority_job = min(job_queue, key=lambda x: (x['priority'], x['created_time']), default=None)
-            if high_priority_job:
-                job_queue.remove(high_priority_job)
-        if high_priority_job:
-            batch_id = high_priority_job['batch_id']
-            ingestion_id = high_priority_job['ingestion_id']
-            ids = high_priority_job['ids']
-            conn = sqlite3.connect('ingestion.db')
-            c = conn.cursor()
-            c.execute("UPDATE batches SET status = ? WHERE batch_id = ?", ('triggered', batch_id))
-            conn.commit()
-            conn.close()
-            await process_batch(batch_id, ingestion_id, ids)
-            await asyncio.sleep(5)  # 5-second rate limit
-        else:
-            await asyncio.sleep(1)
+        _, _, _, batch_id, ids = heapq.heappop(job_queue)
+        await asyncio.to_thread(_set_batch_status_db, batch_id, 'triggered')
+        await process_batch(batch_id, ids)
+        await asyncio.sleep(5)  # 5-second rate limit
 
 @app.on_event("startup")
 async def startup_event():
     asyncio.create_task(process_jobs())
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    WRITER_CONN.close()
+    while not READER_POOL.empty():
+        READER_POOL.get().close()
+
 @app.get("/")
 async def root():
     return {"message": "Data Ingestion API is running"}
 
-@app.post("/ingest")
-async def ingest(request: IngestionRequest):
-    ingestion_id = str(uuid.uuid4())
-    created_time = int(datetime.now().timestamp())
-    conn = sqlite3.connect('ingestion.db')
-    c = conn.cursor()
-    c.execute("INSERT INTO ingestions (ingestion_id, status, created_time) VALUES (?, ?, ?)",
-              (ingestion_id, 'yet_to_start', created_time))
-    batches = [request.ids[i:i+3] for i in range(0, len(request.ids), 3)]
-    for batch_ids in batches:
-        batch_id = str(uuid.uuid4())
-        c.execute("INSERT INTO batches (batch_id, ingestion_id, ids, status) VALUES (?, ?, ?, ?)",
-                  (batch_id, ingestion_id, str(batch_ids), 'yet_to_start'))
-        async with queue_lock:
-            job_queue.append({
-                'batch_id': batch_id,
-                'ingestion_id': ingestion_id,
-                'ids': batch_ids,
-                'priority': request.priority,
-                'created_time': created_time
-            })
-    c.execute("UPDATE ingestions SET status = ? WHERE ingestion_id = ?", ('triggered', ingestion_id))
-    conn.commit()
-    conn.close()
+def _ingest_db(ingestion_id: str, created_time: int, batches: List[tuple]):
+    batch_rows = [(batch_id, ingestion_id, json.dumps(batch_ids), 'yet_to_start') for batch_id, batch_ids in batches]
+    with write_transaction() as c:
+        c.execute("INSERT INTO ingestions (ingestion_id, status, created_time) VALUES (?, ?, ?)",
+                  (ingestion_id, 'yet_to_start', created_time))
+        c.executemany("INSERT INTO batches (batch_id, ingestion_id, ids, status) VALUES (?, ?, ?, ?)", batch_rows)
+        c.execute("UPDATE ingestions SET status = ? WHERE ingestion_id = ?", ('triggered', ingestion_id))
+
+def _read_status_db(ingestion_id: str):
+    with get_reader() as conn:
+        return conn.execute("""SELECT i.status, b.batch_id, b.ids, b.status FROM ingestions i
+                               LEFT JOIN batches b ON b.ingestion_id = i.ingestion_id
+                               WHERE i.ingestion_id = ?""", (ingestion_id,)).fetchall()
+
+def get_batch_ids(batch_id: str, raw_ids: str) -> List[int]:
+    ids = BATCH_IDS_CACHE.get(batch_id)
+    if ids is None:
+        ids = json.loads(raw_ids)
+        BATCH_IDS_CACHE[batch_id] = ids
+    return ids
+
+def split_batches(ids: List[int]) -> List[List[int]]:
+    # zip over one shared iterator yields consecutive triples without per-batch slicing
+    it = iter(ids)
+    batches = list(map(list, zip(it, it, it)))
+    remainder = len(ids) % 3
+    if remainder:
+        batches.append(ids[-remainder:])
+    return batches
+
+def generate_batch_ids(n: int) -> List[str]:
+    raw = os.urandom(16 * n)
+    return [raw[i*16:(i+1)*16].hex() for i in range(n)]
+
+@app.post("/ingest", openapi_extra={"requestBody": {
+    "required": True,
+    "content": {"application/json": {"schema": request_body_schema(IngestionRequest)}}
+}})
+async def ingest(request: Request):
+    try:
+        ingestion_request = parse_ingestion_request(await request.body())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    ingestion_id = uuid.uuid4().hex
+    created_time = int(time.time())
+    enqueued_at = time.monotonic_ns()
+    id_batches = split_batches(ingestion_request.ids)
+    batches = list(zip(generate_batch_ids(len(id_batches)), id_batches))
+    await asyncio.to_thread(_ingest_db, ingestion_id, created_time, batches)
+    for batch_id, batch_ids in batches:
+        BATCH_IDS_CACHE[batch_id] = batch_ids
+    priority_rank = PRIORITY_RANK[ingestion_request.priority]
+    for batch_id, batch_ids in batches:
+        heapq.heappush(job_queue, (priority_rank, enqueued_at, next(job_seq), batch_id, batch_ids))
+    job_event.set()
     return {"ingestion_id": ingestion_id}
 
 @app.get("/status/{ingestion_id}")
 async def get_status(ingestion_id: str):
-    conn = sqlite3.connect('ingestion.db')
-    c = conn.cursor()
-    c.execute("SELECT status, created_time FROM ingestions WHERE ingestion_id = ?", (ingestion_id,))
-    ingestion = c.fetchone()
-    if not ingestion:
-        conn.close()
+    cached = COMPLETED_STATUS_CACHE.get(ingestion_id)
+    if cached is not None:
+        return Response(content=cached, media_type="application/json")
+    rows = await asyncio.to_thread(_read_status_db, ingestion_id)
+    if not rows:
         raise HTTPException(status_code=404, detail="Ingestion ID not found")
-    c.execute("SELECT batch_id, ids, status FROM batches WHERE ingestion_id = ?", (ingestion_id,))
-    batches = [{"batch_id": row[0], "ids": eval(row[1]), "status": row[2]} for row in c.fetchall()]
-    conn.close()
-    return {
+    status = {
         "ingestion_id": ingestion_id,
-        "status": ingestion[0],
-        "batches": batches
+        "status": rows[0][0],
+        "batches": [{"batch_id": row[1], "ids": get_batch_ids(row[1], row[2]), "status": row[3]}
+                    for row in rows if row[1] is not None]
     }
+    if status["status"] == 'completed':
+        body = orjson.dumps(status)
+        COMPLETED_STATUS_CACHE[ingestion_id] = body
+        return Response(content=body, media_type="application/json")
+    return status
 
 if __name__ == "__main__":
     # Use environment variable PORT, default to 8000 if not set
@@ -4,6 +4,9 @@ import time
 from httpx import AsyncClient
 from main import app, Priority
 from main import init_db
+from main import _ingest_db, _set_batch_status_db
+from main import split_batches
+from main import LRUCache, COMPLETED_STATUS_CACHE
 import sqlite3
 
 @pytest.fixture
@@ -45,6 +48,36 @@ async def test_empty_ids(client, setup_db):
     assert response.status_code == 400
     assert "IDs list cannot be empty" in response.json()["detail"]
 
+@pytest.mark.asyncio
+async def test_extra_keys(client, setup_db):
+    response = await client.post("/ingest", json={"ids": [1, 2], "priority": "HIGH", "source": "x"})
+    assert response.status_code == 400
+    assert "Request body must be an object with 'ids' and 'priority' only" in response.json()["detail"]
+
+    response = await client.post("/ingest", json={"ids": [1, 2]})
+    assert response.status_code == 400
+    assert "Request body must be an object with 'ids' and 'priority' only" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_non_integer_ids(client, setup_db):
+    for ids in (["1"], [True], [1.5], [1, 2.0]):
+        response = await client.post("/ingest", json={"ids": ids, "priority": "HIGH"})
+        assert response.status_code == 400
+        assert "IDs must be a list of integers" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_invalid_priority(client, setup_db):
+    response = await client.post("/ingest", json={"ids": [1, 2], "priority": "URGENT"})
+    assert response.status_code == 400
+    assert "'URGENT' is not a valid Priority" in response.json()["detail"]
+
+@pytest.mark.asyncio
+async def test_malformed_body(client, setup_db):
+    for body in (b"", b"not json", b"{\"ids\": [1,"):
+        response = await client.post("/ingest", content=body, headers={"Content-Type": "application/json"})
+        assert response.status_code == 400
+        assert "Request body must be valid JSON" in response.json()["detail"]
+
 @pytest.mark.asyncio
 async def test_status_endpoint(client, setup_db):
     response = await client.post("/ingest", json={"ids": [1, 2, 3, 4, 5], "priority": "MEDIUM"})
@@ -97,5 +130,59 @@ async def test_invalid_ingestion_id(client, setup_db):
     assert response.status_code == 404
     assert "Ingestion ID not found" in response.json()["detail"]
 
+@pytest.mark.asyncio
+async def test_completed_status_is_cached(client, setup_db):
+    response = await client.post("/ingest", json={"ids": [1, 2, 3, 4], "priority": "LOW"})
+    ingestion_id = response.json()["ingestion_id"]
+    response = await client.get(f"/status/{ingestion_id}")
+    for batch in response.json()["batches"]:
+        _set_batch_status_db(batch["batch_id"], "completed")
+
+    first = await client.get(f"/status/{ingestion_id}")
+    assert first.status_code == 200
+    assert first.json()["status"] == "completed"
+    assert ingestion_id in COMPLETED_STATUS_CACHE
+
+    second = await client.get(f"/status/{ingestion_id}")
+    assert second.status_code == 200
+    assert second.content == first.content
+
+def test_status_roll_up(setup_db):
+    def ingestion_status():
+        conn = sqlite3.connect("ingestion.db")
+        status = conn.execute("SELECT status FROM ingestions WHERE ingestion_id = ?", ("roll-up",)).fetchone()[0]
+        conn.close()
+        return status
+
+    _ingest_db("roll-up", int(time.time()), [("roll-up-1", [1, 2, 3]), ("roll-up-2", [4, 5])])
+    assert ingestion_status() == "triggered"
+
+    for batch_id, batch_status, expected in [
+        ("roll-up-1", "triggered", "triggered"),
+        ("roll-up-1", "completed", "yet_to_start"),
+        ("roll-up-2", "triggered", "triggered"),
+        ("roll-up-2", "completed", "completed"),
+    ]:
+        _set_batch_status_db(batch_id, batch_status)
+        assert ingestion_status() == expected
+
+def test_split_batches():
+    for n in range(1, 8):
+        ids = list(range(1, n + 1))
+        assert split_batches(ids) == [ids[i:i+3] for i in range(0, len(ids), 3)]
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2)
+    cache["a"] = 1
+    cache["b"] = 2
+    assert cache.get("a") == 1  # refreshes "a", leaving "b" least recently used
+    cache["c"] = 3
+    assert list(cache) == ["a", "c"]
+    assert cache.get("b") is None
+
+    cache["a"] = 4  # re-setting also refreshes
+    cache["d"] = 5
+    assert list(cache.items()) == [("a", 4), ("d", 5)]
+
 if __name__ == "__main__":
     pytest.main(["-v"])
\ No newline at end of file